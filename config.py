@@ -1,40 +1,87 @@
 import os
-from typing import Optional
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Mapping, Optional
 from dotenv import load_dotenv
 
-load_dotenv()  # Load environment variables from .env file
 
+def _load_env() -> dict:
+    """Load the .env file once per process and snapshot the environment"""
+    if not os.environ.get("_DOTENV_LOADED"):
+        load_dotenv()  # Load environment variables from .env file
+        os.environ["_DOTENV_LOADED"] = "1"
+    return dict(os.environ)
+
+@dataclass(frozen=True, slots=True)
 class Config:
     """Application configuration"""
-    
+
     # API Configuration
-    API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
-    API_PORT: int = int(os.getenv("API_PORT", "8000"))
-    
+    API_HOST: str = "0.0.0.0"
+    API_PORT: int = 8000
+    API_WORKERS: int = 2
+
     # OpenAI Configuration
-    OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "YOUR_OPENAI_API_KEY_HERE")
-    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")  # or "gpt-4", "gpt-4-turbo"
+    OPENAI_API_KEY: str = "YOUR_OPENAI_API_KEY_HERE"
+    OPENAI_MODEL: str = "gpt-4o-mini"  # Must support structured outputs, e.g. "gpt-4o"
+    OPENAI_OCR_MODEL: str = "gpt-4o"  # OCR needs a vision-capable model
+    OPENAI_BATCH_ENABLED: bool = False  # Use the Batch API for bulk parsing (async delivery, up to 24h)
+    OPENAI_BATCH_POLL_INTERVAL: float = 30.0  # Seconds between batch status checks
+
+    # LLM response cache (disabled unless a path is set)
+    LLM_CACHE_PATH: str = ""
+    LLM_CACHE_TTL: int = 604800  # Seconds; 0 keeps entries forever
     
     # OCR Configuration
-    OCR_LANGUAGES: list = os.getenv("OCR_LANGUAGES", "en").split(",")
-    OCR_GPU: bool = os.getenv("OCR_GPU", "false").lower() == "true"
-    OCR_CONFIDENCE_THRESHOLD: float = float(os.getenv("OCR_CONFIDENCE_THRESHOLD", "0.3"))
-    
+    OCR_LANGUAGES: tuple = ("en",)
+    OCR_GPU: bool = False
+    OCR_CONFIDENCE_THRESHOLD: float = 0.3
+
     # File Upload Limits
-    MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB default
-    ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"}
-    
+    MAX_FILE_SIZE: int = 10485760  # 10MB default
+    ALLOWED_EXTENSIONS: frozenset = frozenset({".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"})
+
     # Logging
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
-    
+    LOG_LEVEL: str = "INFO"
+
     @classmethod
-    def validate_config(cls):
+    def from_env(cls, env: Mapping[str, str]) -> "Config":
+        """Build the configuration from an environment snapshot"""
+        return cls(
+            API_HOST=env.get("API_HOST", "0.0.0.0"),
+            API_PORT=int(env.get("API_PORT", "8000")),
+            API_WORKERS=int(env.get("API_WORKERS", max(2, (os.cpu_count() or 2) // 2))),
+            OPENAI_API_KEY=env.get("OPENAI_API_KEY", "YOUR_OPENAI_API_KEY_HERE"),
+            OPENAI_MODEL=env.get("OPENAI_MODEL", "gpt-4o-mini"),
+            OPENAI_OCR_MODEL=env.get("OPENAI_OCR_MODEL", env.get("OPENAI_MODEL", "gpt-4o")),
+            OPENAI_BATCH_ENABLED=env.get("OPENAI_BATCH_ENABLED", "false").lower() == "true",
+            OPENAI_BATCH_POLL_INTERVAL=float(env.get("OPENAI_BATCH_POLL_INTERVAL", "30")),
+            LLM_CACHE_PATH=env.get("LLM_CACHE_PATH", ""),
+            LLM_CACHE_TTL=int(env.get("LLM_CACHE_TTL", "604800")),
+            OCR_LANGUAGES=tuple(env.get("OCR_LANGUAGES", "en").split(",")),
+            OCR_GPU=env.get("OCR_GPU", "false").lower() == "true",
+            OCR_CONFIDENCE_THRESHOLD=float(env.get("OCR_CONFIDENCE_THRESHOLD", "0.3")),
+            MAX_FILE_SIZE=int(env.get("MAX_FILE_SIZE", "10485760")),
+            LOG_LEVEL=env.get("LOG_LEVEL", "INFO"),
+        )
+
+    @property
+    def has_openai_api_key(self) -> bool:
+        """Whether a real OpenAI API key (not the placeholder) is configured"""
+        return bool(self.OPENAI_API_KEY) and self.OPENAI_API_KEY != "YOUR_OPENAI_API_KEY_HERE"
+
+    def validate_config(self):
         """Validate configuration"""
-        if cls.OPENAI_API_KEY == "YOUR_OPENAI_API_KEY_HERE" or not cls.OPENAI_API_KEY:
+        if not self.has_openai_api_key:
             raise ValueError(
                 "OPENAI_API_KEY environment variable is required. "
                 "Please get your API key from https://platform.openai.com/api-keys"
             )
 
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Return the process-wide configuration, loading it on first use"""
+    return Config.from_env(_load_env())
+
 # Create global config instance
-config = Config()
\ No newline at end of file
+config = get_config()
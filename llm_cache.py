@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import orjson
+from typing import Dict, Any, Optional
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_connection: Optional[sqlite3.Connection] = None
+_connection_lock = threading.Lock()
+
+# Expired rows are deleted when the cache opens and again after this many writes
+PURGE_EVERY_WRITES = 1000
+_writes_since_purge = 0
+
+def _get_connection() -> sqlite3.Connection:
+    """Open the SQLite cache on first use and create the table if needed"""
+    global _connection
+    # Cache calls run in worker threads, so two of them may race to open the connection
+    with _connection_lock:
+        if _connection is None:
+            connection = sqlite3.connect(config.LLM_CACHE_PATH, isolation_level=None, check_same_thread=False)
+            try:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("CREATE TABLE IF NOT EXISTS cache (k BLOB PRIMARY KEY, v BLOB, ts INTEGER)")
+                connection.execute("CREATE INDEX IF NOT EXISTS cache_ts ON cache (ts)")
+                _purge_expired(connection)
+            except sqlite3.Error:
+                # Keep nothing half set up (e.g. another worker held the lock); the next call retries
+                connection.close()
+                raise
+            _connection = connection
+    return _connection
+
+def _purge_expired(connection: sqlite3.Connection):
+    """Delete entries older than LLM_CACHE_TTL so the cache file does not grow without bound"""
+    if config.LLM_CACHE_TTL:
+        connection.execute("DELETE FROM cache WHERE ts < ?", (int(time.time()) - config.LLM_CACHE_TTL,))
+
+def is_enabled() -> bool:
+    """The cache is only used when LLM_CACHE_PATH is set"""
+    return bool(config.LLM_CACHE_PATH)
+
+async def get(key: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Look up a cached LLM response without blocking the event loop
+    
+    SQLite calls can wait on another worker's write lock, so they run in a thread.
+
+    Args:
+        key: Content hash identifying the request
+
+    Returns:
+        Optional[Dict[str, Any]]: The cached parsed response, or None on a miss or expired entry
+    """
+    if not is_enabled():
+        return None
+    return await asyncio.to_thread(_get, key)
+
+def _get(key: bytes) -> Optional[Dict[str, Any]]:
+    """Blocking lookup behind get()"""
+    try:
+        row = _get_connection().execute("SELECT v, ts FROM cache WHERE k = ?", (key,)).fetchone()
+    except sqlite3.Error as e:
+        logger.warning("LLM cache lookup failed: %s", e)
+        return None
+    if row is None:
+        return None
+    value, timestamp = row
+    if config.LLM_CACHE_TTL and time.time() - timestamp > config.LLM_CACHE_TTL:
+        return None
+    return orjson.loads(value)
+
+async def set(key: bytes, value: Dict[str, Any]):
+    """
+    Store a parsed LLM response without blocking the event loop
+
+    Args:
+        key: Content hash identifying the request
+        value: Parsed response to cache
+    """
+    if not is_enabled():
+        return
+    await asyncio.to_thread(_set, key, value)
+
+def _set(key: bytes, value: Dict[str, Any]):
+    """Blocking write behind set()"""
+    global _writes_since_purge
+    try:
+        connection = _get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (k, v, ts) VALUES (?, ?, ?)",
+            (key, orjson.dumps(value), int(time.time()))
+        )
+        _writes_since_purge += 1
+        if _writes_since_purge >= PURGE_EVERY_WRITES:
+            _writes_since_purge = 0
+            _purge_expired(connection)
+    except sqlite3.Error as e:
+        logger.warning("LLM cache write failed: %s", e)
@@ -1,21 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
 from models import ReceiptData, ErrorResponse, Response
-from ocr_service import OCRService
-from receipt_parser import ReceiptParser
+from ocr_service import OCRService, create_http_session
+from receipt_parser import get_receipt_parser, aclose as close_parser_client
 import logging
 from config import config
 from transformers import create_success_response, create_error_response, receipt_data_to_json_with_formatting, receipt_data_to_dict
 
 # Configure logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+logger.setLevel(config.LOG_LEVEL.upper())
+
+# Uploads are read in chunks of this size so oversized files are rejected early
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the pooled HTTP session on startup and close it on shutdown"""
+    app.state.http = create_http_session()
+    ocr_service.session = app.state.http
+    # Pay the TCP/TLS handshakes at startup; a first receipt arriving while the warmed
+    # connections are still pooled (30s parser, 75s OCR keep-alive) skips them
+    await asyncio.gather(ocr_service.warm_up(), receipt_parser.warm_up(), return_exceptions=True)
+    try:
+        yield
+    finally:
+        await app.state.http.close()
+        await close_parser_client()
 
 app = FastAPI(
     title="Receipt OCR API",
     description="API for extracting structured data from receipt images",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -29,7 +51,7 @@ app.add_middleware(
 
 # Initialize services
 ocr_service = OCRService()
-receipt_parser = ReceiptParser()
+receipt_parser = get_receipt_parser()
 
 @app.post("/process-receipt", response_model=Response)
 async def process_receipt(file: UploadFile = File(...)):
@@ -59,12 +81,31 @@ async def process_receipt(file: UploadFile = File(...)):
             )
         
         # Check file size (optional - adjust max size as needed)
-        max_file_size = 10 * 1024 * 1024  # 10MB
+        max_file_size = config.MAX_FILE_SIZE
         file_size = 0
         
+        # Reject on the size reported by the multipart parser before reading anything
+        if file.size is not None and file.size > max_file_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File size ({file.size} bytes) exceeds maximum allowed size ({max_file_size} bytes)"
+            )
+        
         # Read file content
         try:
-            image_bytes = await file.read()
+            if file.size is not None:
+                # Size is known and within the limit: a single exact-size read
+                image_bytes = await file.read()
+            else:
+                # Unknown size: read in chunks, stopping as soon as the limit is exceeded
+                image_bytes = bytearray()
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    image_bytes += chunk
+                    if len(image_bytes) > max_file_size:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File size exceeds maximum allowed size ({max_file_size} bytes)"
+                        )
             file_size = len(image_bytes)
             
             if file_size == 0:
@@ -72,25 +113,22 @@ async def process_receipt(file: UploadFile = File(...)):
                     status_code=400,
                     detail="Uploaded file is empty"
                 )
-            
-            if file_size > max_file_size:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"File size ({file_size} bytes) exceeds maximum allowed size ({max_file_size} bytes)"
-                )
                 
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=400,
                 detail=f"Error reading uploaded file: {str(e)}"
             )
         
-        logger.info(f"Processing uploaded receipt image: {file.filename} ({file_size} bytes)")
+        logger.info("Processing uploaded receipt image: %s (%d bytes)", file.filename, file_size)
         
         # Extract text using OCR
-        raw_text = await ocr_service.extract_text(image_bytes)
+        raw_text = await ocr_service.extract_text(image_bytes, file.content_type)
         
-        if not raw_text.strip():
+        # extract_text() already returns stripped text
+        if not raw_text:
             raise HTTPException(
                 status_code=422,
                 detail="No text could be extracted from the image"
@@ -101,14 +139,15 @@ async def process_receipt(file: UploadFile = File(...)):
 
         logger.info("Receipt processed successfully")
 
-        print(create_success_response(receipt_data))
+        logger.debug("response=%s", receipt_data)
 
-        return create_success_response(receipt_data)
+        # Serialize once here; returning a response skips FastAPI's response_model re-validation
+        return ORJSONResponse(content=create_success_response(receipt_data).model_dump(mode="json"))
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error processing receipt: {str(e)}")
+        logger.error("Error processing receipt: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error while processing receipt"
@@ -120,4 +159,5 @@ async def health_check():
     return {"status": "healthy", "service": "Receipt OCR API"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host=config.API_HOST, port=config.API_PORT)
\ No newline at end of file
+    # uvicorn[standard] provides uvloop and httptools, which uvicorn selects automatically
+    uvicorn.run("main:app", host=config.API_HOST, port=config.API_PORT, workers=config.API_WORKERS)
\ No newline at end of file
@@ -1,7 +1,28 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import datetime
-from decimal import Decimal
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, List, Optional
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+_ZERO = Decimal("0")
+
+def _safe_decimal(value: Any) -> Optional[Decimal]:
+    """Safely convert a value to Decimal, returning None if conversion fails"""
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, bool):
+        # bool is an int subclass, but True/False are not amounts
+        return None
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        # repr() gives the shortest round-tripping form, e.g. 3.99 rather than its binary expansion
+        return Decimal(repr(value))
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
 
 class ImageRequest(BaseModel):
     """Request model for base64 encoded image"""
@@ -9,14 +30,16 @@ class ImageRequest(BaseModel):
 
 class LineItem(BaseModel):
     """Individual item on the receipt"""
-    description: str = Field(..., description="Item description")
+    description: str = Field("Unknown Item", description="Item description")
     quantity: Optional[int] = Field(None, description="Quantity purchased")
     unit_price: Optional[Decimal] = Field(None, description="Price per unit")
-    total_price: Decimal = Field(..., description="Total price for this item")
+    total_price: Decimal = Field(_ZERO, description="Total price for this item")
+
+    _coerce_unit_price = field_validator("unit_price", mode="before")(_safe_decimal)
 
 class MerchantInfo(BaseModel):
     """Merchant/store information"""
-    name: str = Field(..., description="Store/merchant name")
+    name: str = Field("Unknown Store", description="Store/merchant name")
     address: Optional[str] = Field(None, description="Store address")
     phone: Optional[str] = Field(None, description="Store phone number")
 
@@ -26,21 +49,23 @@ class TransactionInfo(BaseModel):
     time: Optional[str] = Field(None, description="Transaction time")
     subtotal: Optional[Decimal] = Field(None, description="Subtotal before tax")
     tax: Optional[Decimal] = Field(None, description="Tax amount")
-    total: Decimal = Field(..., description="Total amount")
+    total: Decimal = Field(_ZERO, description="Total amount")
     payment_method: Optional[str] = Field(None, description="Payment method used")
 
+    _coerce_amounts = field_validator("subtotal", "tax", mode="before")(_safe_decimal)
+
 class ReceiptData(BaseModel):
     """Complete receipt data structure"""
-    merchant: MerchantInfo
-    transaction: TransactionInfo
-    items: List[LineItem] = Field(..., description="List of items purchased")
+    merchant: MerchantInfo = Field(default_factory=MerchantInfo)
+    transaction: TransactionInfo = Field(default_factory=TransactionInfo)
+    items: List[LineItem] = Field(default_factory=list, description="List of items purchased")
     raw_text: Optional[str] = Field(None, description="Original OCR text for debugging")
 
 class Response(BaseModel):
     """Success response model"""
     status: str = Field("success", description="Response status")
     status_code: int = Field(200, description="HTTP status code")
-    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Response timestamp")
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="Response timestamp (UTC)")
     data: ReceiptData = Field(..., description="Extracted receipt data")
 
 class ErrorResponse(BaseModel):
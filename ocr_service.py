@@ -1,76 +1,114 @@
+import asyncio
+import json
 import logging
-import base64
-import os
+import pybase64
+from typing import Optional, Union
 import aiohttp
-from dotenv import load_dotenv
-
-load_dotenv()
+from config import config
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+logger.setLevel(config.LOG_LEVEL.upper())
+
+API_URL = "https://api.openai.com/v1/chat/completions"
+API_KEY = config.OPENAI_API_KEY
+MODEL = config.OPENAI_OCR_MODEL
+
+def create_http_session() -> aiohttp.ClientSession:
+    """Create a pooled HTTP session that keeps connections to the OpenAI API alive"""
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300, keepalive_timeout=75)
+    )
 
 class OCRService:
-    async def extract_text(self, image_content: bytes) -> str:
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
+        """Initialize the OCR service with an optional shared HTTP session"""
+        self.session = session
+
+    async def warm_up(self, timeout: float = 5.0):
+        """
+        Open a connection to the OpenAI API ahead of the first request
+        
+        The connection stays pooled for the connector's 75s keep-alive; a first request
+        within that window skips the TCP/TLS handshake, a later one pays it as usual.
+        """
+        if self.session is None or self.session.closed:
+            self.session = create_http_session()
+        try:
+            # Any response (typically 404) will do; the connection stays in the keep-alive pool
+            async with self.session.head(API_URL, timeout=aiohttp.ClientTimeout(total=timeout)):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("OCR connection warm-up failed: %s", e)
+
+    async def extract_text(self, image_content: Union[bytes, bytearray], content_type: str = "image/png") -> str:
         """
         Extract text from an image using OpenAI's GPT-4o (receipt_parser.py style)
         """
         logger.info("Starting LLM-based OCR processing for image")
 
-        api_url = "https://api.openai.com/v1/chat/completions"
-        api_key = os.getenv("OPENAI_API_KEY")
-        model = os.getenv("OPENAI_MODEL", "gpt-4o")
-
-        if not api_key:
+        if not config.has_openai_api_key:
             logger.error("OpenAI API key not set. Please set OPENAI_API_KEY environment variable.")
             raise Exception("OpenAI API key not configured.")
 
+        if self.session is None or self.session.closed:
+            # No app-managed session (e.g. lifespan did not run); open one lazily
+            self.session = create_http_session()
+
         try:
-            image_base64 = base64.b64encode(image_content).decode('utf-8')
-            logger.info("Image encoded to base64")
-
-            payload = {
-                "model": model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are an OCR assistant. Extract all readable text from the provided image."
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "max_tokens": 2000,
-                "temperature": 0.1
-            }
+            # Encoding and serializing a multi-MB image is CPU-bound; keep it off the event loop
+            body = await asyncio.to_thread(self._build_request_body, image_content, content_type)
 
             headers = {
                 "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
+                "Authorization": f"Bearer {API_KEY}"
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(api_url, headers=headers, json=payload) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenAI API error: {response.status} - {error_text}")
-                        raise Exception(f"OpenAI API error: {response.status} - {error_text}")
+            async with self.session.post(API_URL, headers=headers, data=body) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error("OpenAI API error: %s - %s", response.status, error_text)
+                    raise Exception(f"OpenAI API error: {response.status} - {error_text}")
 
-                    response_data = await response.json()
-                    if "choices" not in response_data or len(response_data["choices"]) == 0:
-                        raise Exception("No response from OpenAI API")
+                response_data = await response.json()
+                choices = response_data.get("choices")
+                if not choices:
+                    raise Exception("No response from OpenAI API")
 
-                    extracted_text = response_data["choices"][0]["message"]["content"].strip()
-                    logger.info("Successfully extracted text using LLM")
-                    return extracted_text
+                extracted_text = choices[0]["message"]["content"].strip()
+                logger.info("Successfully extracted text using LLM")
+                return extracted_text
 
         except Exception as e:
-            logger.error(f"Error during LLM OCR processing: {e}")
-            raise Exception(f"LLM OCR processing failed: {str(e)}")
\ No newline at end of file
+            logger.error("Error during LLM OCR processing: %s", e)
+            raise RuntimeError("LLM OCR processing failed") from e
+
+    def _build_request_body(self, image_content: Union[bytes, bytearray], content_type: str) -> bytes:
+        """Encode the image and serialize the chat completion request body"""
+        # Use the upload's MIME type rather than assuming PNG
+        image_url = f"data:{content_type};base64,{pybase64.b64encode(image_content).decode('ascii')}"
+        logger.debug("Image encoded to base64")
+
+        payload = {
+            "model": MODEL,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are an OCR assistant. Extract all readable text from the provided image."
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url
+                            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": 2000,
+            "temperature": 0.1
+        }
+
+        return json.dumps(payload).encode("utf-8")
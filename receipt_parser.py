@@ -1,26 +1,152 @@
-import json
+import asyncio
+import hashlib
 import logging
-from typing import Dict, Any, Optional
-from models import ReceiptData, MerchantInfo, TransactionInfo, LineItem
-from decimal import Decimal
-import re
-import aiohttp
-import os
-from dotenv import load_dotenv
+from functools import lru_cache
+from typing import Dict, Any, List, Union
+from models import ReceiptData
+import fastjsonschema
+import httpx
+import orjson
+import llm_cache
+from config import config
 
 logger = logging.getLogger(__name__)
-load_dotenv()  # Load environment variables from .env file
+
+def _create_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP/2 client used for all parsing requests"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0),
+        timeout=httpx.Timeout(120, connect=10),
+        http2=True
+    )
+
+# Shared by all parser instances; HTTP/2 lets concurrent parses multiplex over one connection
+_CLIENT = _create_client()
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, recreating it if it has been closed"""
+    global _CLIENT
+    if _CLIENT.is_closed:
+        _CLIENT = _create_client()
+    return _CLIENT
+
+async def aclose():
+    """Close the shared HTTP client (called on app shutdown)"""
+    await _CLIENT.aclose()
+
+# Bump when the prompt or response handling changes to invalidate cached responses
+PROMPT_VERSION = "v2"
+
+# Static parsing instructions, sent as the first message so every request shares a
+# byte-identical prefix (OpenAI caches repeated prompt prefixes automatically)
+SYSTEM_PROMPT = """You are a receipt parsing expert. You must respond only with valid JSON data, no explanations or additional text.
+
+You will be given raw OCR text from a receipt. Extract structured information from it and return ONLY a valid JSON object with the following structure. Do not include any other text, explanations, or formatting:
+
+{
+    "merchant": {
+        "name": "Store Name",
+        "address": "Store Address if available",
+        "phone": "Phone number if available"
+    },
+    "transaction": {
+        "date": "Transaction date if available (YYYY-MM-DD format)",
+        "time": "Transaction time if available (HH:MM format)",
+        "subtotal": 0.00,
+        "tax": 0.00,
+        "total": 0.00,
+        "payment_method": "Payment method if available"
+    },
+    "items": [
+        {
+            "description": "Item description",
+            "quantity": 1,
+            "unit_price": 0.00,
+            "total_price": 0.00
+        }
+    ]
+}
+
+Important guidelines:
+- Extract all line items with their descriptions and prices
+- Use null for missing information rather than empty strings
+- Ensure all prices are numeric values (not strings)
+- If quantity is not specified, assume 1
+- Be as accurate as possible with item descriptions
+- Total should match the final amount paid
+- Look for common receipt patterns like subtotal, tax, and total lines
+- Identify the merchant name, usually at the top of the receipt
+- Extract date and time from timestamp information
+- Your response must be valid JSON only, no other text or formatting"""
+
+# JSON schema for the response, enforced server-side by structured outputs. Strict mode
+# requires every property to be listed as required; optional values are nullable instead.
+RECEIPT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "merchant": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "address": {"type": ["string", "null"]},
+                "phone": {"type": ["string", "null"]}
+            },
+            "required": ["name", "address", "phone"],
+            "additionalProperties": False
+        },
+        "transaction": {
+            "type": "object",
+            "properties": {
+                "date": {"type": ["string", "null"]},
+                "time": {"type": ["string", "null"]},
+                "subtotal": {"type": ["number", "null"]},
+                "tax": {"type": ["number", "null"]},
+                "total": {"type": "number"},
+                "payment_method": {"type": ["string", "null"]}
+            },
+            "required": ["date", "time", "subtotal", "tax", "total", "payment_method"],
+            "additionalProperties": False
+        },
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "description": {"type": "string"},
+                    "quantity": {"type": ["integer", "null"]},
+                    "unit_price": {"type": ["number", "null"]},
+                    "total_price": {"type": "number"}
+                },
+                "required": ["description", "quantity", "unit_price", "total_price"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["merchant", "transaction", "items"],
+    "additionalProperties": False
+}
+
+# Compiled once at import; checks a parsed response before it is converted
+_VALIDATE_RECEIPT = fastjsonschema.compile(RECEIPT_SCHEMA)
+
+# Re-prompts with the validation error before giving up on a malformed response
+SCHEMA_RETRIES = 2
+
+# The per-receipt user message is the OCR text wrapped in these fixed pieces
+_PROMPT_PREFIX = "Raw OCR Text:\n"
+_PROMPT_SUFFIX = "\n\nRESPOND ONLY WITH VALID JSON. NO OTHER TEXT."
 
 class ReceiptParser:
     """Service for parsing raw OCR text into structured receipt data using OpenAI GPT"""
     
     def __init__(self):
         """Initialize the receipt parser"""
-        self.api_url = "https://api.openai.com/v1/chat/completions"
-        self.api_key = os.getenv("OPENAI_API_KEY", "YOUR_OPENAI_API_KEY_HERE")
-        self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")  # or "gpt-4", "gpt-4-turbo"
+        self.api_base = "https://api.openai.com/v1"
+        self.api_url = f"{self.api_base}/chat/completions"
+        self.api_key = config.OPENAI_API_KEY
+        self.model = config.OPENAI_MODEL
         
-        if self.api_key == "YOUR_OPENAI_API_KEY_HERE" or not self.api_key:
+        if not config.has_openai_api_key:
             logger.warning("OpenAI API key not set. Please set OPENAI_API_KEY environment variable.")
         
     async def parse_receipt(self, raw_text: str) -> ReceiptData:
@@ -34,193 +160,279 @@ class ReceiptParser:
             ReceiptData: Structured receipt information
         """
         try:
-            # Create prompt for GPT to parse the receipt
-            prompt = self._create_parsing_prompt(raw_text)
+            # Identical OCR text parses to the same result; reuse a cached response when available
+            cache_key = self._cache_key(raw_text)
+            parsed_data = await llm_cache.get(cache_key)
+            cache_hit = parsed_data is not None
             
-            # Call OpenAI API
-            parsed_data = await self._call_openai_api(prompt)
+            if not cache_hit:
+                # Create prompt for GPT to parse the receipt
+                prompt = self._create_parsing_prompt(raw_text)
+                
+                # Call OpenAI API
+                parsed_data = await self._call_openai_api(prompt)
             
             # Convert to ReceiptData model
             receipt_data = self._convert_to_receipt_data(parsed_data, raw_text)
             
+            # Only cache responses that converted cleanly
+            if not cache_hit:
+                await llm_cache.set(cache_key, parsed_data)
+            
             return receipt_data
             
         except Exception as e:
-            logger.error(f"Error parsing receipt: {e}")
-            raise Exception(f"Receipt parsing failed: {str(e)}")
+            logger.error("Error parsing receipt: %s", e)
+            raise RuntimeError("Receipt parsing failed") from e
+    
+    async def parse_receipts(self, raw_texts: List[str], max_concurrency: int = 20) -> List[Union[ReceiptData, Exception]]:
+        """
+        Parse many receipts concurrently over the shared HTTP client
+        
+        Args:
+            raw_texts: Raw OCR texts, one per receipt
+            max_concurrency: Maximum number of requests in flight at once
+            
+        Returns:
+            List[Union[ReceiptData, Exception]]: One result per input, in order; failed receipts
+            are returned as their exception instead of aborting the others
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def parse_one(raw_text: str) -> ReceiptData:
+            async with semaphore:
+                return await self.parse_receipt(raw_text)
+        
+        return await asyncio.gather(*(parse_one(raw_text) for raw_text in raw_texts), return_exceptions=True)
+    
+    def _cache_key(self, raw_text: str) -> bytes:
+        """Content hash of everything that determines the parsed response"""
+        return hashlib.sha256(f"{PROMPT_VERSION}|openai|{self.model}|{raw_text}".encode("utf-8")).digest()
     
     def _create_parsing_prompt(self, raw_text: str) -> str:
-        """Create a prompt for GPT to parse the receipt"""
-        return f"""
-        You are an expert at parsing receipt data. Please analyze the following raw OCR text from a receipt and extract structured information.
-
-        Raw OCR Text:
-        {raw_text}
-
-        Please extract and return ONLY a valid JSON object with the following structure. Do not include any other text, explanations, or formatting:
-
-        {{
-            "merchant": {{
-                "name": "Store Name",
-                "address": "Store Address if available",
-                "phone": "Phone number if available"
-            }},
-            "transaction": {{
-                "date": "Transaction date if available (YYYY-MM-DD format)",
-                "time": "Transaction time if available (HH:MM format)",
-                "subtotal": 0.00,
-                "tax": 0.00,
-                "total": 0.00,
-                "payment_method": "Payment method if available"
-            }},
-            "items": [
-                {{
-                    "description": "Item description",
-                    "quantity": 1,
-                    "unit_price": 0.00,
-                    "total_price": 0.00
-                }}
-            ]
-        }}
-
-        Important guidelines:
-        - Extract all line items with their descriptions and prices
-        - Use null for missing information rather than empty strings
-        - Ensure all prices are numeric values (not strings)
-        - If quantity is not specified, assume 1
-        - Be as accurate as possible with item descriptions
-        - Total should match the final amount paid
-        - Look for common receipt patterns like subtotal, tax, and total lines
-        - Identify the merchant name, usually at the top of the receipt
-        - Extract date and time from timestamp information
-        - Your response must be valid JSON only, no other text or formatting
-
-        RESPOND ONLY WITH VALID JSON. NO OTHER TEXT.
+        """Create the per-receipt part of the prompt; the static instructions live in SYSTEM_PROMPT"""
+        return _PROMPT_PREFIX + raw_text + _PROMPT_SUFFIX
+    
+    async def parse_receipts_batch(self, raw_texts: List[str]) -> List[ReceiptData]:
         """
+        Parse many receipts in one OpenAI Batch API job (half the token cost, delivered asynchronously)
+        
+        Batch jobs may take up to 24 hours, so this is only used when OPENAI_BATCH_ENABLED is set;
+        otherwise each receipt is parsed with a regular request.
+        
+        Args:
+            raw_texts: Raw OCR texts, one per receipt
+            
+        Returns:
+            List[ReceiptData]: Structured receipt information, in the same order as raw_texts
+        """
+        if not config.OPENAI_BATCH_ENABLED:
+            results = await self.parse_receipts(raw_texts)
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+            return results
+        
+        try:
+            if not config.has_openai_api_key:
+                raise Exception("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
+            
+            client = _get_client()
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            
+            # One JSONL line per receipt; custom_id maps results back to their input
+            batch_input = b"\n".join(
+                orjson.dumps({
+                    "custom_id": str(index),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": self._build_payload(self._create_parsing_prompt(raw_text))
+                })
+                for index, raw_text in enumerate(raw_texts)
+            )
+            
+            response = await client.post(
+                f"{self.api_base}/files",
+                headers=headers,
+                data={"purpose": "batch"},
+                files={"file": ("receipts.jsonl", batch_input, "application/jsonl")}
+            )
+            self._raise_for_status(response)
+            input_file_id = response.json()["id"]
+            
+            response = await client.post(
+                f"{self.api_base}/batches",
+                headers=headers,
+                json={"input_file_id": input_file_id, "endpoint": "/v1/chat/completions", "completion_window": "24h"}
+            )
+            self._raise_for_status(response)
+            batch = response.json()
+            logger.info("Submitted OpenAI batch %s with %d receipts", batch["id"], len(raw_texts))
+            
+            while batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+                await asyncio.sleep(config.OPENAI_BATCH_POLL_INTERVAL)
+                response = await client.get(f"{self.api_base}/batches/{batch['id']}", headers=headers)
+                self._raise_for_status(response)
+                batch = response.json()
+            
+            if batch["status"] != "completed" or not batch.get("output_file_id"):
+                raise Exception(f"OpenAI batch {batch['id']} finished with status {batch['status']}")
+            
+            response = await client.get(f"{self.api_base}/files/{batch['output_file_id']}/content", headers=headers)
+            self._raise_for_status(response)
+            
+            results: Dict[int, ReceiptData] = {}
+            for line in response.content.splitlines():
+                if not line:
+                    continue
+                result = orjson.loads(line)
+                index = int(result["custom_id"])
+                result_response = result.get("response") or {}
+                if result.get("error") or result_response.get("status_code") != 200:
+                    raise Exception(f"OpenAI batch request {index} failed: {result.get('error') or result_response.get('body')}")
+                parsed_data = self._parse_completion(result_response["body"])
+                # A batch entry cannot be re-prompted, so a schema mismatch fails it outright
+                try:
+                    _VALIDATE_RECEIPT(parsed_data)
+                except fastjsonschema.JsonSchemaException as e:
+                    raise Exception(f"OpenAI batch request {index} does not match the receipt schema: {e.message}") from e
+                results[index] = self._convert_to_receipt_data(parsed_data, raw_texts[index])
+            
+            if len(results) != len(raw_texts):
+                raise Exception(f"OpenAI batch {batch['id']} returned {len(results)} of {len(raw_texts)} results")
+            
+            return [results[index] for index in range(len(raw_texts))]
+            
+        except Exception as e:
+            logger.error("Error parsing receipt batch: %s", e)
+            raise RuntimeError("Receipt batch parsing failed") from e
+    
+    def _build_payload(self, prompt: str) -> Dict[str, Any]:
+        """Build the chat completion request body for a parsing prompt"""
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": 2000,
+            "temperature": 0.1,  # Low temperature for consistent, factual responses
+            # Structured outputs: the model can only produce JSON matching RECEIPT_SCHEMA
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "receipt", "schema": RECEIPT_SCHEMA, "strict": True}
+            }
+        }
+    
+    def _raise_for_status(self, response: httpx.Response):
+        """Log and raise on a non-2xx OpenAI API response"""
+        if not response.is_success:
+            error_text = response.text
+            logger.error("OpenAI API error: %s - %s", response.status_code, error_text)
+            raise Exception(f"OpenAI API error: {response.status_code} - {error_text}")
+    
+    def _parse_completion(self, response_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract the receipt JSON from a chat completion response body"""
+        # Extract the text content from OpenAI's response
+        if "choices" not in response_data or len(response_data["choices"]) == 0:
+            raise Exception("No response from OpenAI API")
+        
+        gpt_text = response_data["choices"][0]["message"]["content"]
+        
+        # Parse JSON (structured outputs guarantee bare JSON matching RECEIPT_SCHEMA)
+        try:
+            return orjson.loads(gpt_text)
+        except orjson.JSONDecodeError as e:
+            logger.error("Failed to parse GPT's JSON response: %s", e)
+            logger.error("Raw response: %s", gpt_text)
+            raise Exception("Failed to parse receipt data from GPT response") from e
     
     async def _call_openai_api(self, prompt: str) -> Dict[str, Any]:
         """Call OpenAI API to parse the receipt"""
         try:
-            if self.api_key == "YOUR_OPENAI_API_KEY_HERE" or not self.api_key:
+            if not config.has_openai_api_key:
                 raise Exception("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
             
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are a receipt parsing expert. You must respond only with valid JSON data, no explanations or additional text."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "max_tokens": 2000,
-                "temperature": 0.1,  # Low temperature for consistent, factual responses
-                "response_format": {"type": "json_object"}  # Force JSON response (GPT-4 Turbo feature)
-            }
-            
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {self.api_key}"
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
+            payload = self._build_payload(prompt)
+            
+            for attempt in range(SCHEMA_RETRIES + 1):
+                async with _get_client().stream(
+                    "POST",
                     self.api_url,
                     headers=headers,
                     json=payload
                 ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenAI API error: {response.status} - {error_text}")
-                        raise Exception(f"OpenAI API error: {response.status} - {error_text}")
-                    
-                    response_data = await response.json()
-                    
-                    # Extract the text content from OpenAI's response
-                    if "choices" not in response_data or len(response_data["choices"]) == 0:
-                        raise Exception("No response from OpenAI API")
-                    
-                    gpt_text = response_data["choices"][0]["message"]["content"]
+                    if not response.is_success:
+                        await response.aread()
+                        self._raise_for_status(response)
                     
-                    # Clean up the response (remove any markdown formatting)
-                    cleaned_text = re.sub(r'```json\n?', '', gpt_text)
-                    cleaned_text = re.sub(r'```\n?', '', cleaned_text).strip()
-                    
-                    # Parse JSON
-                    parsed_data = json.loads(cleaned_text)
-                    
-                    logger.info("Successfully parsed receipt using OpenAI GPT")
-                    return parsed_data
-                    
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse GPT's JSON response: {e}")
-            logger.error(f"Raw response: {gpt_text}")
-            raise Exception("Failed to parse receipt data from GPT response")
+                    # Collect the body as it arrives and decode it once; orjson reads the bytes directly
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        body.extend(chunk)
+                
+                parsed_data = self._parse_completion(orjson.loads(body))
+                
+                try:
+                    _VALIDATE_RECEIPT(parsed_data)
+                except fastjsonschema.JsonSchemaException as e:
+                    if attempt == SCHEMA_RETRIES:
+                        raise Exception(f"GPT response does not match the receipt schema: {e.message}") from e
+                    logger.warning("GPT response failed schema validation (%s), retrying", e.message)
+                    # Show the model its own output and the error so the retry can correct it
+                    payload["messages"] += [
+                        {"role": "assistant", "content": orjson.dumps(parsed_data).decode("utf-8")},
+                        {"role": "user", "content": f"Your output had error: {e.message}. Fix and retry."}
+                    ]
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                    continue
+                
+                logger.info("Successfully parsed receipt using OpenAI GPT")
+                return parsed_data
+                
         except Exception as e:
-            logger.error(f"OpenAI API call failed: {e}")
+            logger.error("OpenAI API call failed: %s", e)
             raise
     
     def _convert_to_receipt_data(self, parsed_data: Dict[str, Any], raw_text: str) -> ReceiptData:
         """Convert parsed data dictionary to ReceiptData model"""
         try:
-            # Extract merchant info
-            merchant_data = parsed_data.get("merchant", {})
-            merchant = MerchantInfo(
-                name=merchant_data.get("name", "Unknown Store"),
-                address=merchant_data.get("address"),
-                phone=merchant_data.get("phone")
-            )
-            
-            # Extract transaction info
-            transaction_data = parsed_data.get("transaction", {})
-            transaction = TransactionInfo(
-                date=transaction_data.get("date"),
-                time=transaction_data.get("time"),
-                subtotal=self._safe_decimal(transaction_data.get("subtotal")),
-                tax=self._safe_decimal(transaction_data.get("tax")),
-                total=Decimal(str(transaction_data.get("total", 0))),
-                payment_method=transaction_data.get("payment_method")
-            )
-            
-            # Extract line items
-            items_data = parsed_data.get("items", [])
-            items = []
-            
-            for item_data in items_data:
-                item = LineItem(
-                    description=item_data.get("description", "Unknown Item"),
-                    quantity=item_data.get("quantity"),
-                    unit_price=self._safe_decimal(item_data.get("unit_price")),
-                    total_price=Decimal(str(item_data.get("total_price", 0)))
-                )
-                items.append(item)
-            
-            # Create receipt data
-            receipt_data = ReceiptData(
-                merchant=merchant,
-                transaction=transaction,
-                items=items,
-                raw_text=raw_text
-            )
-            
-            return receipt_data
+            # Defaults for missing fields and lenient amount parsing live on the models
+            return ReceiptData.model_validate({**parsed_data, "raw_text": raw_text})
             
         except Exception as e:
-            logger.error(f"Error converting parsed data to ReceiptData: {e}")
-            raise Exception("Failed to convert parsed data to structured format")
+            logger.error("Error converting parsed data to ReceiptData: %s", e)
+            raise Exception("Failed to convert parsed data to structured format") from e
     
-    def _safe_decimal(self, value) -> Optional[Decimal]:
-        """Safely convert a value to Decimal, returning None if conversion fails"""
-        if value is None:
-            return None
+    async def warm_up(self, timeout: float = 5.0):
+        """
+        Open a connection to the OpenAI API ahead of the first request
+        
+        The connection stays pooled for the client's 30s keepalive_expiry; a first request
+        within that window skips the TCP/TLS handshake, a later one pays it as usual.
+        """
         try:
-            return Decimal(str(value))
-        except:
-            return None
+            # Any response (typically 404) will do; the connection stays in the shared client's pool
+            await _get_client().head(self.api_base, timeout=timeout)
+        except httpx.HTTPError as e:
+            logger.warning("Parser connection warm-up failed: %s", e)
     
     def is_available(self) -> bool:
         """Check if the OpenAI API service is available"""
-        return self.api_key and self.api_key != "YOUR_OPENAI_API_KEY_HERE"
\ No newline at end of file
+        return config.has_openai_api_key
+
+@lru_cache(maxsize=1)
+def get_receipt_parser() -> ReceiptParser:
+    """Return the process-wide receipt parser, creating it on first use"""
+    return ReceiptParser()
@@ -0,0 +1,31 @@
+import dataclasses
+import httpx
+import pytest
+import llm_cache
+import receipt_parser
+from config import config
+
+@pytest.fixture
+def parser_config(monkeypatch):
+    """Give the parser and cache modules a test configuration; call the fixture value to override fields"""
+    def apply(**overrides):
+        test_config = dataclasses.replace(config, **{"OPENAI_API_KEY": "test-key", "LLM_CACHE_PATH": "", **overrides})
+        monkeypatch.setattr(receipt_parser, "config", test_config)
+        monkeypatch.setattr(llm_cache, "config", test_config)
+        return test_config
+    apply()
+    return apply
+
+@pytest.fixture
+def mock_openai(monkeypatch):
+    """Route the parser's shared HTTP client through an httpx.MockTransport handler"""
+    def install(handler):
+        monkeypatch.setattr(receipt_parser, "_CLIENT", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return install
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """Skip batch polling intervals and retry backoff"""
+    async def sleep(delay):
+        pass
+    monkeypatch.setattr(receipt_parser.asyncio, "sleep", sleep)
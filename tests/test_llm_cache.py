@@ -0,0 +1,83 @@
+import asyncio
+import sqlite3
+import time
+import pytest
+import llm_cache
+
+@pytest.fixture
+def cache(parser_config, monkeypatch, tmp_path):
+    """A cache backed by a fresh SQLite file with a 60s TTL"""
+    parser_config(LLM_CACHE_PATH=str(tmp_path / "cache.db"), LLM_CACHE_TTL=60)
+    monkeypatch.setattr(llm_cache, "_connection", None)
+    yield llm_cache
+    if llm_cache._connection is not None:
+        llm_cache._connection.close()
+
+def insert_aged(key, age):
+    """Write an entry directly with a timestamp age seconds in the past"""
+    llm_cache._get_connection().execute(
+        "INSERT OR REPLACE INTO cache (k, v, ts) VALUES (?, ?, ?)",
+        (key, b'{"stale": true}', int(time.time()) - age)
+    )
+
+def test_set_then_get_returns_the_value(cache):
+    asyncio.run(cache.set(b"key", {"merchant": {"name": "Shop"}}))
+
+    assert asyncio.run(cache.get(b"key")) == {"merchant": {"name": "Shop"}}
+    assert asyncio.run(cache.get(b"other")) is None
+
+def test_disabled_cache_stores_nothing(parser_config, monkeypatch):
+    monkeypatch.setattr(llm_cache, "_connection", None)
+
+    asyncio.run(llm_cache.set(b"key", {"a": 1}))
+
+    assert asyncio.run(llm_cache.get(b"key")) is None
+    assert llm_cache._connection is None
+
+def test_expired_entry_is_a_miss(cache):
+    insert_aged(b"old", 120)
+    insert_aged(b"fresh", 10)
+
+    assert asyncio.run(cache.get(b"old")) is None
+    assert asyncio.run(cache.get(b"fresh")) == {"stale": True}
+
+def test_zero_ttl_never_expires(cache, parser_config):
+    parser_config(LLM_CACHE_PATH=cache.config.LLM_CACHE_PATH, LLM_CACHE_TTL=0)
+    insert_aged(b"old", 10 ** 6)
+
+    assert asyncio.run(cache.get(b"old")) == {"stale": True}
+
+def test_expired_entries_are_purged(cache, monkeypatch):
+    insert_aged(b"old", 120)
+    monkeypatch.setattr(llm_cache, "PURGE_EVERY_WRITES", 1)
+
+    asyncio.run(cache.set(b"new", {"a": 1}))
+
+    keys = {row[0] for row in cache._get_connection().execute("SELECT k FROM cache")}
+    assert keys == {b"new"}
+
+def test_failed_setup_is_retried(cache, monkeypatch):
+    connect = sqlite3.connect
+    failures = [sqlite3.OperationalError("database is locked")]
+
+    class FlakyConnection:
+        """Fails the first CREATE TABLE, as when another worker holds the lock"""
+
+        def __init__(self, connection):
+            self.connection = connection
+
+        def execute(self, sql, *args):
+            if sql.startswith("CREATE TABLE") and failures:
+                raise failures.pop()
+            return self.connection.execute(sql, *args)
+
+        def close(self):
+            self.connection.close()
+
+    monkeypatch.setattr(llm_cache.sqlite3, "connect", lambda *args, **kwargs: FlakyConnection(connect(*args, **kwargs)))
+
+    asyncio.run(cache.set(b"key", {"a": 1}))
+    assert cache._connection is None
+
+    asyncio.run(cache.set(b"key", {"a": 1}))
+    assert asyncio.run(cache.get(b"key")) == {"a": 1}
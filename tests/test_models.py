@@ -0,0 +1,34 @@
+from decimal import Decimal
+import pytest
+from models import LineItem, ReceiptData, TransactionInfo, _safe_decimal
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    (3, Decimal("3")),
+    (3.99, Decimal("3.99")),
+    (0.1, Decimal("0.1")),
+    (Decimal("1.20"), Decimal("1.20")),
+    ("4.50", Decimal("4.50")),
+    ("abc", None),
+    ("", None),
+    ([1], None),
+    (True, None),
+    (False, None),
+])
+def test_safe_decimal(value, expected):
+    assert _safe_decimal(value) == expected
+
+def test_unparseable_optional_amounts_become_none():
+    transaction = TransactionInfo(subtotal="n/a", tax=True, total=3.99)
+    item = LineItem(unit_price="free", total_price=1.5)
+
+    assert (transaction.subtotal, transaction.tax, transaction.total) == (None, None, Decimal("3.99"))
+    assert (item.unit_price, item.total_price) == (None, Decimal("1.5"))
+
+def test_missing_fields_fall_back_to_defaults():
+    receipt = ReceiptData.model_validate({"items": [{}]})
+
+    assert receipt.merchant.name == "Unknown Store"
+    assert receipt.transaction.total == Decimal("0")
+    assert receipt.items[0].description == "Unknown Item"
+    assert receipt.items[0].total_price == Decimal("0")
@@ -0,0 +1,181 @@
+import asyncio
+from decimal import Decimal
+import fastjsonschema
+import httpx
+import orjson
+import pytest
+import llm_cache
+from receipt_parser import ReceiptParser, SCHEMA_RETRIES
+
+def receipt_content(name="Shop"):
+    """A parsed receipt that matches RECEIPT_SCHEMA"""
+    return {
+        "merchant": {"name": name, "address": None, "phone": None},
+        "transaction": {"date": "2024-01-01", "time": None, "subtotal": 3.5, "tax": 0.49, "total": 3.99, "payment_method": None},
+        "items": [{"description": "Milk", "quantity": 1, "unit_price": 3.5, "total_price": 3.5}]
+    }
+
+def completion(content):
+    """Chat completion body carrying content as the model's JSON answer"""
+    return {"choices": [{"message": {"content": orjson.dumps(content).decode("utf-8")}}]}
+
+class FakeBatchAPI:
+    """Serves the Files and Batches endpoints for one batch job"""
+
+    def __init__(self, entries=None, polls_before_done=2):
+        self.entries = entries
+        self.polls_before_done = polls_before_done
+        self.uploaded = []
+        self.polls = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.method == "POST" and path == "/v1/files":
+            body = request.read()
+            self.uploaded = [orjson.loads(line) for line in body.splitlines() if line.startswith(b'{"custom_id"')]
+            return httpx.Response(200, json={"id": "file-in"})
+        if request.method == "POST" and path == "/v1/batches":
+            assert orjson.loads(request.read())["input_file_id"] == "file-in"
+            return httpx.Response(200, json={"id": "batch-1", "status": "validating"})
+        if request.method == "GET" and path == "/v1/batches/batch-1":
+            self.polls += 1
+            if self.polls < self.polls_before_done:
+                return httpx.Response(200, json={"id": "batch-1", "status": "in_progress"})
+            return httpx.Response(200, json={"id": "batch-1", "status": "completed", "output_file_id": "file-out"})
+        if request.method == "GET" and path == "/v1/files/file-out/content":
+            return httpx.Response(200, content=b"\n".join(orjson.dumps(entry) for entry in self.output()))
+        return httpx.Response(404)
+
+    def output(self):
+        if self.entries is not None:
+            return self.entries
+        # Results come back out of order; custom_id is the only link to the input
+        return [
+            {"custom_id": line["custom_id"], "error": None,
+             "response": {"status_code": 200, "body": completion(receipt_content(f"Store {line['custom_id']}"))}}
+            for line in reversed(self.uploaded)
+        ]
+
+def test_batch_round_trip_keeps_input_order(parser_config, mock_openai, no_sleep):
+    parser_config(OPENAI_BATCH_ENABLED=True)
+    api = FakeBatchAPI()
+    mock_openai(api)
+
+    results = asyncio.run(ReceiptParser().parse_receipts_batch(["first", "second", "third"]))
+
+    assert [line["custom_id"] for line in api.uploaded] == ["0", "1", "2"]
+    assert [line["url"] for line in api.uploaded] == ["/v1/chat/completions"] * 3
+    assert api.uploaded[1]["body"]["messages"][-1]["content"].startswith("Raw OCR Text:\nsecond")
+    assert api.polls == 2
+    assert [receipt.merchant.name for receipt in results] == ["Store 0", "Store 1", "Store 2"]
+    assert [receipt.raw_text for receipt in results] == ["first", "second", "third"]
+    assert results[0].transaction.total == Decimal("3.99")
+
+def test_batch_failed_entry_fails_the_batch(parser_config, mock_openai, no_sleep):
+    parser_config(OPENAI_BATCH_ENABLED=True)
+    mock_openai(FakeBatchAPI(entries=[
+        {"custom_id": "0", "error": None, "response": {"status_code": 200, "body": completion(receipt_content())}},
+        {"custom_id": "1", "error": {"code": "server_error"}, "response": None}
+    ]))
+
+    with pytest.raises(RuntimeError) as excinfo:
+        asyncio.run(ReceiptParser().parse_receipts_batch(["first", "second"]))
+    assert "OpenAI batch request 1 failed" in str(excinfo.value.__cause__)
+
+def test_batch_missing_entry_fails_the_batch(parser_config, mock_openai, no_sleep):
+    parser_config(OPENAI_BATCH_ENABLED=True)
+    mock_openai(FakeBatchAPI(entries=[
+        {"custom_id": "0", "error": None, "response": {"status_code": 200, "body": completion(receipt_content())}}
+    ]))
+
+    with pytest.raises(RuntimeError) as excinfo:
+        asyncio.run(ReceiptParser().parse_receipts_batch(["first", "second"]))
+    assert "returned 1 of 2 results" in str(excinfo.value.__cause__)
+
+def test_batch_disabled_parses_each_receipt_directly(parser_config, mock_openai):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=completion(receipt_content()))
+
+    mock_openai(handler)
+
+    results = asyncio.run(ReceiptParser().parse_receipts_batch(["first", "second"]))
+
+    assert {request.url.path for request in requests} == {"/v1/chat/completions"}
+    assert [receipt.raw_text for receipt in results] == ["first", "second"]
+
+def test_cached_response_skips_the_api(parser_config, mock_openai, monkeypatch, tmp_path):
+    parser_config(LLM_CACHE_PATH=str(tmp_path / "cache.db"))
+    monkeypatch.setattr(llm_cache, "_connection", None)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=completion(receipt_content()))
+
+    mock_openai(handler)
+    parser = ReceiptParser()
+
+    async def parse_twice():
+        return await parser.parse_receipt("SHOP\nTOTAL 3.99"), await parser.parse_receipt("SHOP\nTOTAL 3.99")
+
+    first, second = asyncio.run(parse_twice())
+    llm_cache._connection.close()
+
+    assert len(requests) == 1
+    assert first == second
+
+def invalid_receipt_content():
+    """Valid JSON that breaks RECEIPT_SCHEMA (merchant is missing address and phone)"""
+    content = receipt_content()
+    content["merchant"] = {"name": "Shop"}
+    return content
+
+class SequencedCompletions:
+    """Answers chat completion requests with the given contents in turn"""
+
+    def __init__(self, *contents):
+        self.contents = list(contents)
+        self.payloads = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.payloads.append(orjson.loads(request.read()))
+        return httpx.Response(200, json=completion(self.contents[len(self.payloads) - 1]))
+
+def test_schema_mismatch_is_retried_with_feedback(parser_config, mock_openai, no_sleep):
+    api = SequencedCompletions(invalid_receipt_content(), receipt_content("Fixed"))
+    mock_openai(api)
+
+    receipt = asyncio.run(ReceiptParser().parse_receipt("SHOP\nTOTAL 3.99"))
+
+    assert receipt.merchant.name == "Fixed"
+    assert len(api.payloads) == 2
+    retry_messages = api.payloads[1]["messages"]
+    assert [message["role"] for message in retry_messages] == ["system", "user", "assistant", "user"]
+    assert orjson.loads(retry_messages[2]["content"]) == invalid_receipt_content()
+    assert retry_messages[3]["content"].startswith("Your output had error: data.merchant must contain")
+    # The retry keeps the original messages, so the cached prompt prefix is unchanged
+    assert retry_messages[:2] == api.payloads[0]["messages"]
+
+def test_schema_mismatch_gives_up_after_retries(parser_config, mock_openai, no_sleep):
+    api = SequencedCompletions(*[invalid_receipt_content()] * (SCHEMA_RETRIES + 1))
+    mock_openai(api)
+
+    with pytest.raises(RuntimeError) as excinfo:
+        asyncio.run(ReceiptParser().parse_receipt("SHOP\nTOTAL 3.99"))
+
+    assert len(api.payloads) == SCHEMA_RETRIES + 1
+    assert "does not match the receipt schema" in str(excinfo.value.__cause__)
+    assert isinstance(excinfo.value.__cause__.__cause__, fastjsonschema.JsonSchemaException)
+
+def test_batch_entry_failing_the_schema_fails_the_batch(parser_config, mock_openai, no_sleep):
+    parser_config(OPENAI_BATCH_ENABLED=True)
+    mock_openai(FakeBatchAPI(entries=[
+        {"custom_id": "0", "error": None, "response": {"status_code": 200, "body": completion(invalid_receipt_content())}}
+    ]))
+
+    with pytest.raises(RuntimeError) as excinfo:
+        asyncio.run(ReceiptParser().parse_receipts_batch(["first"]))
+    assert "OpenAI batch request 0 does not match the receipt schema" in str(excinfo.value.__cause__)
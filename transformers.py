@@ -1,12 +1,11 @@
-import json
 from typing import Dict, Any
 from decimal import Decimal
 from models import ReceiptData, ErrorResponse, LineItem, MerchantInfo, TransactionInfo, Response
-from datetime import datetime   
+from datetime import datetime, timezone
 
 def receipt_data_to_json(receipt_data: ReceiptData) -> str:
     """
-    Convert ReceiptData object to JSON string by manually mapping all fields.
+    Convert ReceiptData object to JSON string.
     
     Args:
         receipt_data (ReceiptData): The receipt data object to convert
@@ -14,56 +13,19 @@ def receipt_data_to_json(receipt_data: ReceiptData) -> str:
     Returns:
         str: JSON string representation of the receipt data
     """
-    data_dict = receipt_data_to_dict(receipt_data)
-    return json.dumps(data_dict, ensure_ascii=False)
+    return receipt_data.model_dump_json()
 
 def receipt_data_to_dict(receipt_data: ReceiptData) -> Dict[str, Any]:
     """
-    Convert ReceiptData object to dictionary by manually mapping all fields.
+    Convert ReceiptData object to a JSON-compatible dictionary.
     
     Args:
         receipt_data (ReceiptData): The receipt data object to convert
         
     Returns:
-        Dict[str, Any]: Dictionary representation of the receipt data
+        Dict[str, Any]: Dictionary representation of the receipt data (amounts as exact decimal strings)
     """
-    # Map merchant info
-    merchant_dict = {
-        "name": receipt_data.merchant.name,
-        "address": receipt_data.merchant.address,
-        "phone": receipt_data.merchant.phone
-    }
-    
-    # Map transaction info
-    transaction_dict = {
-        "date": receipt_data.transaction.date,
-        "time": receipt_data.transaction.time,
-        "subtotal": float(receipt_data.transaction.subtotal) if receipt_data.transaction.subtotal is not None else None,
-        "tax": float(receipt_data.transaction.tax) if receipt_data.transaction.tax is not None else None,
-        "total": float(receipt_data.transaction.total),
-        "payment_method": receipt_data.transaction.payment_method
-    }
-    
-    # Map line items
-    items_list = []
-    for item in receipt_data.items:
-        item_dict = {
-            "description": item.description,
-            "quantity": item.quantity,
-            "unit_price": float(item.unit_price) if item.unit_price is not None else None,
-            "total_price": float(item.total_price)
-        }
-        items_list.append(item_dict)
-    
-    # Combine all data
-    result = {
-        "merchant": merchant_dict,
-        "transaction": transaction_dict,
-        "items": items_list,
-        "raw_text": receipt_data.raw_text
-    }
-    
-    return result
+    return receipt_data.model_dump(mode="json")
 
 def receipt_data_to_json_with_formatting(receipt_data: ReceiptData, indent: int = 2) -> str:
     """
@@ -76,8 +38,7 @@ def receipt_data_to_json_with_formatting(receipt_data: ReceiptData, indent: int
     Returns:
         str: Formatted JSON string representation of the receipt data
     """
-    data_dict = receipt_data_to_dict(receipt_data)
-    return json.dumps(data_dict, indent=indent, ensure_ascii=False)
+    return receipt_data.model_dump_json(indent=indent)
 
 def create_success_response(receipt_data: ReceiptData, status_code: int = 200) -> Response:
     """
@@ -88,14 +49,10 @@ def create_success_response(receipt_data: ReceiptData, status_code: int = 200) -
         status_code (int): HTTP status code (default: 200)
         
     Returns:
-        Dict[str, Any]: Complete response payload with metadata
+        Response: Complete response payload with metadata
     """
-    return {
-        "status": "success",
-        "status_code": status_code,
-        "data": receipt_data_to_dict(receipt_data),
-        "timestamp": datetime.now().isoformat()
-    }
+    # Hand the model over as-is; the Decimal fields are never round-tripped through float
+    return Response(status_code=status_code, data=receipt_data)
 
 def create_error_response(error: ErrorResponse, status_code: int = 400) -> Dict[str, Any]:
     """
@@ -106,7 +63,8 @@ def create_error_response(error: ErrorResponse, status_code: int = 400) -> Dict[
         status_code (int): HTTP status code (default: 400)
         
     Returns:
-        Dict[str, Any]: Complete error response payload
+        Dict[str, Any]: Complete error response payload; the timestamp is left as a UTC
+        datetime for the JSON encoder (orjson) to format
     """
     error_dict = {
         "detail": error.detail,
@@ -117,7 +75,7 @@ def create_error_response(error: ErrorResponse, status_code: int = 400) -> Dict[
         "status": "error",
         "status_code": status_code,
         "error": error_dict,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now(timezone.utc)
     }
 
 # Example usage:
@@ -175,4 +133,4 @@ if __name__ == "__main__":
     
     print("\nComplete success response:")
     success_response = create_success_response(receipt)
-    print(json.dumps(success_response, indent=2))
\ No newline at end of file
+    print(success_response.model_dump_json(indent=2))
\ No newline at end of file